@@ -1,11 +1,20 @@
-from flask import Flask, render_template, jsonify
+from flask import Flask, render_template, jsonify, request, Response
 from flask_socketio import SocketIO
 from pymongo import MongoClient
 from datetime import datetime, timedelta
+import functools
+import gzip
+import hashlib
 import threading
 import time
 import json
 from bson import json_util
+import numpy as np
+
+try:
+    import brotli
+except ImportError:
+    brotli = None  # Brotli is optional; gzip is always available
 
 app = Flask(__name__)
 app.config['SECRET_KEY'] = 'monitor-secret-key'
@@ -18,6 +27,343 @@ db = client['system_monitoring']
 # Store last known state to detect changes
 last_counts = {}
 
+# Number of entries returned by /api/data by default, and the most a client may ask for
+HISTORY_LIMIT = 50
+MAX_HISTORY_LIMIT = 500
+
+# Shared API response cache. Every dashboard tab polls the same endpoints,
+# so responses are cached for a short time and shared between all viewers.
+API_CACHE_TTL = 2  # seconds
+MIN_COMPRESS_SIZE = 512  # bytes; smaller bodies are sent uncompressed
+MAX_CACHE_ENTRIES = 256
+response_cache = {}
+inflight_requests = {}
+cache_lock = threading.Lock()
+
+def _render_entry(view, args, kwargs):
+    """Run a view and turn its result into a cache entry"""
+    response = app.make_response(view(*args, **kwargs))
+    body = response.get_data()
+    return {
+        'body': body,
+        'status': response.status_code,
+        'mimetype': response.mimetype,
+        'etag': hashlib.sha1(body).hexdigest(),
+        'encoded': {},
+        'expires': time.monotonic() + API_CACHE_TTL
+    }
+
+def _store_entry(key, entry):
+    """Add an entry to the cache, dropping expired and least recently stored entries"""
+    now = time.monotonic()
+    response_cache.pop(key, None)
+    response_cache[key] = entry
+    for old_key in [k for k, e in response_cache.items() if e['expires'] <= now]:
+        del response_cache[old_key]
+    while len(response_cache) > MAX_CACHE_ENTRIES:
+        del response_cache[next(iter(response_cache))]
+
+def _get_cached_entry(key, view, args, kwargs):
+    """
+    Return a fresh cache entry for key, running the view at most once.
+    Concurrent requests for the same key wait for the first one to finish
+    and share its result, even when it is an error, instead of running their own queries.
+    """
+    while True:
+        with cache_lock:
+            entry = response_cache.get(key)
+            if entry and entry['expires'] > time.monotonic():
+                return entry
+            inflight = inflight_requests.get(key)
+            if inflight is None:
+                inflight = {'event': threading.Event(), 'entry': None}
+                inflight_requests[key] = inflight
+                break
+        # Another request is already querying MongoDB, wait for its result
+        inflight['event'].wait()
+        if inflight['entry'] is not None:
+            return inflight['entry']
+
+    try:
+        entry = _render_entry(view, args, kwargs)
+        inflight['entry'] = entry
+        if entry['status'] == 200:
+            with cache_lock:
+                _store_entry(key, entry)
+        return entry
+    finally:
+        with cache_lock:
+            del inflight_requests[key]
+        inflight['event'].set()
+
+def _encode_body(entry):
+    """Pick the best encoding the client accepts and return (encoding, body)"""
+    if len(entry['body']) < MIN_COMPRESS_SIZE:
+        return None, entry['body']
+    if brotli is not None and request.accept_encodings['br']:
+        encoding = 'br'
+    elif request.accept_encodings['gzip']:
+        encoding = 'gzip'
+    else:
+        return None, entry['body']
+
+    # Compressed bodies are cached with the entry so each variant is built once
+    if encoding not in entry['encoded']:
+        if encoding == 'br':
+            entry['encoded'][encoding] = brotli.compress(entry['body'])
+        else:
+            entry['encoded'][encoding] = gzip.compress(entry['body'])
+    return encoding, entry['encoded'][encoding]
+
+def _make_response(entry):
+    """Build the response for a cache entry, honouring If-None-Match and Accept-Encoding"""
+    if entry['status'] == 200 and request.if_none_match.contains_weak(entry['etag']):
+        response = Response(status=304)
+    else:
+        encoding, body = _encode_body(entry)
+        response = Response(body, status=entry['status'], mimetype=entry['mimetype'])
+        if encoding:
+            response.headers['Content-Encoding'] = encoding
+
+    if entry['status'] == 200:
+        # Weak, since the same tag is sent for every content encoding of the body
+        response.set_etag(entry['etag'], weak=True)
+        # Let browsers keep the body but revalidate on every poll
+        response.headers['Cache-Control'] = 'no-cache'
+    response.vary.add('Accept-Encoding')
+    return response
+
+def cached_api(*params, bypass=()):
+    """
+    Serve a JSON API view from the shared response cache.
+    Only the query parameters listed in params are part of the cache key.
+    Requests with any of the query parameters listed in bypass are per-client
+    and skip the cache, but are still compressed and given an ETag.
+    Supports conditional GET (ETag / If-None-Match) and gzip/brotli compression.
+    """
+    def decorator(view):
+        @functools.wraps(view)
+        def wrapper(*args, **kwargs):
+            if any(param in request.args for param in bypass):
+                return _make_response(_render_entry(view, args, kwargs))
+            key = (request.path,) + tuple(request.args.get(param) for param in params)
+            entry = _get_cached_entry(key, view, args, kwargs)
+            return _make_response(entry)
+        return wrapper
+    return decorator
+
+# Rolling statistics kept in memory for every student, fed by the monitor thread
+ROLLING_WINDOW = 600  # seconds (10 minutes)
+ROLLING_CAPACITY = 1200  # samples kept per student, enough for 1Hz with some slack
+EWMA_ALPHA = 0.1
+STAT_FIELDS = ('Temperature', 'RAM')
+STAT_NAMES = ('last', 'mean', 'ewma', 'min', 'max', 'p50', 'p95', 'samples')
+rolling_stats = {}
+stats_lock = threading.Lock()
+
+class RollingStats:
+    """
+    Ring buffer of recent samples for one student.
+    Adding a sample is O(1); window statistics are computed with NumPy on request.
+    """
+
+    def __init__(self, capacity=ROLLING_CAPACITY):
+        self.times = np.zeros(capacity)
+        self.values = np.zeros((capacity, len(STAT_FIELDS)))
+        self.ewma = None
+        self.next_index = 0
+        self.size = 0
+
+    def add(self, timestamp, values):
+        """Add one sample (a sequence of values in STAT_FIELDS order)"""
+        values = np.asarray(values, dtype=float)
+        self.times[self.next_index] = timestamp
+        self.values[self.next_index] = values
+        self.next_index = (self.next_index + 1) % len(self.times)
+        self.size = min(self.size + 1, len(self.times))
+
+        if self.ewma is None:
+            self.ewma = values
+        else:
+            self.ewma = EWMA_ALPHA * values + (1 - EWMA_ALPHA) * self.ewma
+
+    def summary(self, since):
+        """Return {field: {stat: value}} for samples newer than since, or None if there are none"""
+        times = self.times[:self.size]
+        in_window = times >= since
+        if not in_window.any():
+            return None
+
+        window = self.values[:self.size][in_window]
+        last = self.values[(self.next_index - 1) % len(self.times)]
+        p50, p95 = np.percentile(window, [50, 95], axis=0)
+        summary = {}
+        for i, field in enumerate(STAT_FIELDS):
+            summary[field] = {
+                'last': float(last[i]),
+                'mean': float(window[:, i].mean()),
+                'ewma': float(self.ewma[i]),
+                'min': float(window[:, i].min()),
+                'max': float(window[:, i].max()),
+                'p50': float(p50[i]),
+                'p95': float(p95[i]),
+                'samples': int(len(window))
+            }
+        return summary
+
+def record_sample(entry):
+    """Feed a new metrics document into the rolling statistics"""
+    # Use the time the monitor received the sample: student clocks may be
+    # off or in local time, so their timestamps can't be compared with ours
+    received = time.time()
+    with stats_lock:
+        if entry['ID'] not in rolling_stats:
+            rolling_stats[entry['ID']] = RollingStats()
+        rolling_stats[entry['ID']].add(received, [entry[field] for field in STAT_FIELDS])
+
+# Alert rules, evaluated on every new sample. 'ID': None applies a rule to all students.
+#   threshold: alert when field goes above 'max' and/or below 'min'
+#   rate:      alert when field changes faster than 'limit' units per second
+#   stale:     alert when a student has not reported for 'seconds'
+ALERT_RULES = [
+    {'name': 'high-temperature', 'type': 'threshold', 'field': 'Temperature', 'max': 90, 'ID': None},
+    {'name': 'temperature-spike', 'type': 'rate', 'field': 'Temperature', 'limit': 5, 'ID': None},
+    {'name': 'agent-stopped', 'type': 'stale', 'seconds': 30, 'ID': None}
+]
+TIMER_WHEEL_SLOTS = 64  # one slot per second
+
+class AlertEngine:
+    """
+    Incremental rules engine over the metric stream.
+    Rules are indexed by (field, ID) so each sample only checks the rules that
+    apply to it, and staleness deadlines live in a timer wheel instead of being rescanned.
+    Alerts fire once when a rule starts matching and re-arm when it stops.
+    The first sample seen for a student may be old history (e.g. when the
+    monitor starts up), so rules only apply from the second, newer sample on.
+    on_alert must return True once the alert has been delivered; undelivered
+    alerts are retried on the next sample (or tick, for staleness).
+    """
+
+    def __init__(self, rules, on_alert):
+        self.on_alert = on_alert
+        self.rules_by_field = {}  # (field, ID or None) -> threshold and rate rules
+        self.stale_rules = {}  # ID or None -> stale rules
+        self.stale_by_name = {}
+        names = set()
+        for rule in rules:
+            if rule['name'] in names:
+                raise ValueError(f"Duplicate alert rule name: {rule['name']}")
+            names.add(rule['name'])
+            if rule['type'] == 'stale':
+                self.stale_rules.setdefault(rule['ID'], []).append(rule)
+                self.stale_by_name[rule['name']] = rule
+            elif rule['type'] in ('threshold', 'rate'):
+                self.rules_by_field.setdefault((rule['field'], rule['ID']), []).append(rule)
+            else:
+                raise ValueError(f"Unknown alert rule type: {rule['type']}")
+
+        self.previous = {}  # ID -> previous sample
+        self.active = set()  # (rule name, ID) of alerts currently firing
+        self.deadlines = {}  # (rule name, ID) -> current staleness deadline
+        self.wheel = [[] for _ in range(TIMER_WHEEL_SLOTS)]
+        self.wheel_time = int(time.time())
+
+    def _update(self, rule, student_id, matched, value, message):
+        """Track whether a rule matches and send an alert when it starts matching"""
+        key = (rule['name'], student_id)
+        if not matched:
+            self.active.discard(key)
+        elif key not in self.active:
+            delivered = self.on_alert({
+                'rule': rule['name'],
+                'type': rule['type'],
+                'field': rule.get('field'),
+                'ID': student_id,
+                'value': value,
+                'message': message,
+                'timestamp': datetime.utcnow()
+            })
+            if not delivered:
+                return False
+            self.active.add(key)
+        return True
+
+    def _schedule(self, key, deadline):
+        self.deadlines[key] = deadline
+        self._add_to_wheel(key, deadline)
+
+    def _add_to_wheel(self, key, deadline):
+        # Use the slot of the first whole second after the deadline, so the
+        # entry has expired by the time the wheel reaches it
+        self.wheel[(int(deadline) + 1) % TIMER_WHEEL_SLOTS].append((deadline, key))
+
+    def add_sample(self, entry, now):
+        """Evaluate the rules matching a new metrics document, received at time now"""
+        student_id = entry['ID']
+        previous = self.previous.get(student_id)
+        self.previous[student_id] = entry
+        if previous is None or entry['timestamp'] <= previous['timestamp']:
+            return
+        # Only compared with the student's previous timestamp: student clocks
+        # may be off or in local time, so deadlines use the receive time instead
+        elapsed = (entry['timestamp'] - previous['timestamp']).total_seconds()
+
+        for field, value in entry.items():
+            if not isinstance(value, (int, float)):
+                continue
+            for rule in self.rules_by_field.get((field, student_id), []) + self.rules_by_field.get((field, None), []):
+                if rule['type'] == 'threshold':
+                    matched = (('max' in rule and value > rule['max']) or
+                               ('min' in rule and value < rule['min']))
+                    self._update(rule, student_id, matched, value,
+                                 f"{field} of {student_id} is {value}")
+                elif field in previous:
+                    rate = (value - previous[field]) / elapsed
+                    self._update(rule, student_id, abs(rate) > rule['limit'], rate,
+                                 f"{field} of {student_id} is changing by {rate:.2f}/s")
+
+        # A new sample resolves staleness alerts and pushes the deadline forward
+        for rule in self.stale_rules.get(student_id, []) + self.stale_rules.get(None, []):
+            self._update(rule, student_id, False, None, None)
+            self._schedule((rule['name'], student_id), now + rule['seconds'])
+
+    def tick(self, now):
+        """Advance the timer wheel to now and fire any expired staleness deadlines"""
+        while self.wheel_time <= int(now):
+            slot = self.wheel[self.wheel_time % TIMER_WHEEL_SLOTS]
+            self.wheel[self.wheel_time % TIMER_WHEEL_SLOTS] = []
+            for deadline, key in slot:
+                if self.deadlines.get(key) != deadline:
+                    continue  # Superseded by a newer sample
+                if deadline > now:
+                    self._add_to_wheel(key, deadline)
+                    continue  # Due in a later turn of the wheel
+                del self.deadlines[key]
+                rule_name, student_id = key
+                rule = self.stale_by_name[rule_name]
+                if not self._update(rule, student_id, True, None,
+                                    f"{student_id} has not reported for {rule['seconds']} seconds"):
+                    self._schedule(key, now + 1)  # Retry delivery on the next tick
+            self.wheel_time += 1
+
+def send_alert(alert):
+    """
+    Record an alert in the alerts collection and push it to the dashboards.
+    Returns False if the alert could not be recorded, so it is retried later.
+    """
+    try:
+        db.alerts.insert_one(dict(alert))
+    except Exception as e:
+        print(f"Alert error: {e}")
+        return False
+    try:
+        socketio.emit('alert', {**alert, 'timestamp': alert['timestamp'].isoformat()})
+    except Exception as e:
+        print(f"Alert emit error: {e}")
+    return True
+
+alert_engine = AlertEngine(ALERT_RULES, send_alert)
+
 def monitor_database():
     """
     Background thread that monitors database for new entries
@@ -47,6 +393,8 @@ def monitor_database():
                     
                     # Emit the new data
                     last_entry = result['last_entry']
+                    record_sample(last_entry)
+                    alert_engine.add_sample(last_entry, time.time())
                     socketio.emit('new_data', {
                         'CPU': last_entry['CPU'],
                         'RAM': last_entry['RAM'],
@@ -55,17 +403,27 @@ def monitor_database():
                         'timestamp': last_entry['timestamp'].isoformat()
                     })
             
+            alert_engine.tick(time.time())
             time.sleep(0.5)  # Check every 500ms
             
         except Exception as e:
             print(f"Monitor error: {e}")
             time.sleep(1)
 
+def parse_timestamp(value):
+    """Parse a timestamp in the format produced by datetime.isoformat()"""
+    # datetime.fromisoformat() is not available on Python 3.6
+    try:
+        return datetime.strptime(value, '%Y-%m-%dT%H:%M:%S.%f')
+    except ValueError:
+        return datetime.strptime(value, '%Y-%m-%dT%H:%M:%S')
+
 @app.route('/')
 def dashboard():
     return render_template('dashboard.html')
 
 @app.route('/api/students')
+@cached_api()
 def get_students():
     """Get list of active students (those who submitted in last 5 minutes)"""
     try:
@@ -78,14 +436,30 @@ def get_students():
         return jsonify({'error': str(e)}), 500
 
 @app.route('/api/data/<int:student_id>')
+@cached_api('limit', bypass=('since',))
 def get_student_data(student_id):
-    """Get recent data for a specific student"""
+    """
+    Get recent data for a specific student
+    Pass ?since=<ISO timestamp> to get only entries newer than that timestamp,
+    and ?limit=<n> to change how many entries are returned
+    """
     try:
-        # Get last 50 entries
+        query = {'ID': student_id}
+        since = request.args.get('since')
+        if since:
+            try:
+                query['timestamp'] = {'$gt': parse_timestamp(since)}
+            except ValueError:
+                return jsonify({'error': f'Invalid since timestamp: {since}'}), 400
+
+        limit = request.args.get('limit', HISTORY_LIMIT, type=int)
+        limit = max(1, min(limit, MAX_HISTORY_LIMIT))
+
+        # Get the newest entries, served from the (ID, timestamp) index
         data_from_db = list(db.metrics.find(
-            {'ID': student_id},
+            query,
             {'_id': 0}
-        ).sort('timestamp', -1).limit(50))
+        ).sort('timestamp', -1).limit(limit))
         
         # Reverse to get chronological order (oldest to newest)
         data_from_db.reverse()
@@ -112,6 +486,7 @@ def get_student_data(student_id):
         return jsonify({'error': str(e)}), 500
 
 @app.route('/api/stats')
+@cached_api()
 def get_stats():
     """Get database statistics"""
     try:
@@ -126,6 +501,42 @@ def get_stats():
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+@app.route('/api/summary')
+def get_summary():
+    """
+    Rank students by a rolling statistic over the last ROLLING_WINDOW seconds.
+    Served from memory, without querying MongoDB.
+    Query parameters: field (Temperature/RAM), stat (e.g. p95), order (desc/asc), limit
+    """
+    field = request.args.get('field', 'Temperature')
+    stat = request.args.get('stat', 'mean')
+    order = request.args.get('order', 'desc')
+    limit = request.args.get('limit', type=int)
+    if field not in STAT_FIELDS:
+        return jsonify({'error': f'Unknown field: {field}'}), 400
+    if stat not in STAT_NAMES:
+        return jsonify({'error': f'Unknown stat: {stat}'}), 400
+    if order not in ('asc', 'desc'):
+        return jsonify({'error': f'Unknown order: {order}'}), 400
+
+    since = time.time() - ROLLING_WINDOW
+    ranking = []
+    with stats_lock:
+        for student_id, stats in rolling_stats.items():
+            summary = stats.summary(since)
+            if summary is not None:
+                ranking.append({'ID': student_id, **summary})
+
+    ranking.sort(key=lambda item: item[field][stat], reverse=(order == 'desc'))
+    if limit is not None:
+        ranking = ranking[:max(limit, 0)]
+    return jsonify({
+        'field': field,
+        'stat': stat,
+        'window_seconds': ROLLING_WINDOW,
+        'students': ranking
+    })
+
 @app.route('/api/validation_errors')
 def get_validation_errors():
     """